@@ -1,7 +1,14 @@
-from flask import Flask, render_template, request, url_for, flash, redirect, jsonify, send_from_directory
+from flask import Flask, render_template, request, url_for, flash, redirect, jsonify, send_from_directory, \
+    Response, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_bcrypt import Bcrypt
+import click
+import contextlib
+import csv
+import io
 import os
+import sys
+import tempfile
 from dotenv import load_dotenv
 from datetime import datetime
 import json
@@ -41,6 +48,12 @@ psycopg_db_url = os.getenv("DATABASE_URL_PG", None)
 # Control whether we try to auto-create the database (useful only for local dev)
 AUTO_CREATE_DB = os.getenv("AUTO_CREATE_DB", "true").lower() == "true"
 
+# Rows fetched per round-trip when streaming history exports, and rows written
+# per INSERT/COPY batch when importing. Memory use is bounded by these, not by
+# the size of the table.
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 1000))
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", 1000))
+
 app = Flask(__name__)
 app.config["SQLALCHEMY_DATABASE_URI"] = sqlalchemy_db_url
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
@@ -583,6 +596,367 @@ def show_database(username):
     return render_template('db.html', output=output, username=username, timestamp=timestamp)
 
 
+# Columns included in history exports and accepted by history imports
+HISTORY_COLUMNS = ['sNo', 'prompt', 'responses', 'history', 'timestamp']
+# Columns an import must provide (sNo is reassigned, history is optional)
+REQUIRED_IMPORT_COLUMNS = ['prompt', 'responses', 'timestamp']
+EXPORT_MIMETYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+def iter_history_rows(table_model, batch_size=EXPORT_BATCH_SIZE):
+    """Yield history rows as dicts using a server-side cursor.
+
+    yield_per makes SQLAlchemy stream results in batches (a named cursor on
+    psycopg2) instead of loading the whole table the way .query.all() does.
+    """
+    stmt = (
+        db.select(table_model)
+        .order_by(table_model.sNo)
+        .execution_options(yield_per=batch_size)
+    )
+    for row in db.session.execute(stmt).scalars():
+        yield {
+            'sNo': row.sNo,
+            'prompt': row.prompt,
+            'responses': row.responses,
+            'history': row.history,
+            'timestamp': row.timestamp.isoformat() if row.timestamp else None,
+        }
+        # Rows are only needed until they are serialized
+        db.session.expunge(row)
+
+
+def iter_batches(rows, batch_size):
+    """Group an iterable of rows into lists of at most batch_size."""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def export_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row, default=str) + "\n"
+
+
+def export_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=HISTORY_COLUMNS)
+    writer.writeheader()
+    for row in rows:
+        row = dict(row, history=json.dumps(row['history']) if row['history'] is not None else None)
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+class ParquetUnavailableError(Exception):
+    """Raised when a Parquet export is requested but pyarrow is not installed."""
+
+
+def export_parquet(rows, path, batch_size=EXPORT_BATCH_SIZE):
+    """Write rows to a Parquet file, one row group per batch (requires pyarrow)."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ParquetUnavailableError("Parquet export requires pyarrow (pip install pyarrow)")
+
+    schema = pa.schema([
+        ('sNo', pa.int64()),
+        ('prompt', pa.string()),
+        ('responses', pa.string()),
+        ('history', pa.string()),
+        ('timestamp', pa.string()),
+    ])
+    with pq.ParquetWriter(path, schema) as writer:
+        for batch in iter_batches(rows, batch_size):
+            for row in batch:
+                row['history'] = json.dumps(row['history']) if row['history'] is not None else None
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+
+
+def read_history_file(stream, fmt):
+    """Yield history rows from an NDJSON or CSV text stream, one line at a time."""
+    if fmt == 'ndjson':
+        for line in stream:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+    elif fmt == 'csv':
+        reader = csv.DictReader(stream)
+        if reader.fieldnames is None:
+            return
+        missing = [col for col in REQUIRED_IMPORT_COLUMNS if col not in reader.fieldnames]
+        if missing:
+            raise ValueError(f"CSV header is missing columns: {', '.join(missing)}")
+        for row in reader:
+            # CSV cannot tell an empty string from NULL; exports write NULL as
+            # an empty cell, so read empty cells back as None
+            row = {key: (value if value != '' else None) for key, value in row.items()}
+            row['history'] = json.loads(row['history']) if row.get('history') else None
+            yield row
+    else:
+        raise ValueError(f"Unsupported import format: {fmt}")
+
+
+def normalize_history_row(row):
+    """Validate one imported row, raising ValueError on bad input."""
+    if not isinstance(row, dict):
+        raise ValueError(f"Each row must be an object, got {type(row).__name__}")
+    unknown = [str(key) for key in row if key not in HISTORY_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+    missing = [col for col in ('prompt', 'responses') if col not in row]
+    if missing:
+        raise ValueError(f"Row is missing columns: {', '.join(missing)}")
+    for field in ('prompt', 'responses'):
+        if row.get(field) is not None and not isinstance(row[field], str):
+            raise ValueError(f"'{field}' must be a string")
+    history = row.get('history')
+    if isinstance(history, str):
+        history = json.loads(history)
+    timestamp = row.get('timestamp')
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp) if timestamp else None
+    elif timestamp is not None and not isinstance(timestamp, datetime):
+        raise ValueError("'timestamp' must be an ISO 8601 string")
+    return {
+        'prompt': row.get('prompt'),
+        'responses': row.get('responses'),
+        'history': history,
+        # Only rows without a timestamp column are stamped with the import
+        # time; an explicit null is kept as null
+        'timestamp': timestamp if 'timestamp' in row else datetime.now(),
+    }
+
+
+def copy_csv_field(value):
+    # NULL is written as an unquoted \N and every other value is quoted, so
+    # empty strings (and a literal "\N") survive COPY as strings, not NULL.
+    if value is None:
+        return '\\N'
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def copy_history_batch(table_model, batch):
+    """Load one batch with PostgreSQL COPY ... FROM STDIN.
+
+    Runs on the session's connection so it shares the import transaction.
+    """
+    buffer = io.StringIO()
+    for row in batch:
+        fields = [
+            row['prompt'],
+            row['responses'],
+            json.dumps(row['history']) if row['history'] is not None else None,
+            row['timestamp'].isoformat() if row['timestamp'] is not None else None,
+        ]
+        buffer.write(','.join(copy_csv_field(field) for field in fields) + '\n')
+    buffer.seek(0)
+
+    table_name = db.engine.dialect.identifier_preparer.quote(table_model.__tablename__)
+    raw_cursor = db.session.connection().connection.cursor()
+    try:
+        raw_cursor.copy_expert(
+            f"COPY {table_name} (prompt, responses, history, timestamp) "
+            f"FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+            buffer,
+        )
+    finally:
+        raw_cursor.close()
+
+
+def import_history_rows(email, rows, batch_size=IMPORT_BATCH_SIZE):
+    """Bulk-load history rows into a user's table and return the row count.
+
+    Uses COPY on PostgreSQL and batched executemany INSERTs elsewhere. sNo is
+    not preserved so imported rows never collide with existing ones. All
+    batches run in one transaction, so a bad row anywhere leaves the table
+    untouched and the import can simply be retried.
+    """
+    create_user_table(email)
+    table_model = create_db_table(email)
+    use_copy = db.engine.dialect.name == 'postgresql'
+
+    # Bind every column explicitly so an imported null timestamp is stored
+    # as null instead of picking up the model's column default
+    insert_stmt = db.insert(table_model).values({
+        col: db.bindparam(col) for col in ('prompt', 'responses', 'history', 'timestamp')
+    })
+
+    total = 0
+    try:
+        for batch in iter_batches((normalize_history_row(row) for row in rows), batch_size):
+            if use_copy:
+                copy_history_batch(table_model, batch)
+            else:
+                db.session.execute(insert_stmt, batch)
+            total += len(batch)
+        if total == 0:
+            raise ValueError("Import contained no rows")
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return total
+
+
+@app.route('/export/<username>', methods=['GET'])
+def export_history(username):
+    user = UserCreds.query.filter_by(name=username).first()
+    if not user:
+        return "User not found", 404
+
+    fmt = request.args.get('format', 'ndjson').lower()
+    if fmt not in EXPORT_MIMETYPES:
+        return jsonify({"success": False, "error": f"Unsupported format: {fmt}"}), 400
+
+    table_model = create_db_table(user.email)
+    filename = f"{username}_history.{fmt}"
+    headers = {'Content-Disposition': f'attachment; filename="{filename}"'}
+
+    if fmt == 'parquet':
+        # Parquet needs a file to write its footer into, so spool to disk
+        # and stream the file back rather than holding it in memory.
+        tmp = tempfile.NamedTemporaryFile(suffix='.parquet', delete=False)
+        tmp.close()
+        try:
+            export_parquet(iter_history_rows(table_model), tmp.name)
+        except ParquetUnavailableError as e:
+            os.remove(tmp.name)
+            return jsonify({"success": False, "error": str(e)}), 400
+        except Exception as e:
+            os.remove(tmp.name)
+            print(f"Error exporting history: {e}")
+            import traceback
+            traceback.print_exc()
+            return jsonify({"success": False, "error": "Export failed"}), 500
+
+        def stream_file():
+            try:
+                with open(tmp.name, 'rb') as f:
+                    while chunk := f.read(64 * 1024):
+                        yield chunk
+            finally:
+                os.remove(tmp.name)
+
+        return Response(stream_file(), mimetype=EXPORT_MIMETYPES[fmt], headers=headers)
+
+    serializer = export_ndjson if fmt == 'ndjson' else export_csv
+    return Response(
+        stream_with_context(serializer(iter_history_rows(table_model))),
+        mimetype=EXPORT_MIMETYPES[fmt],
+        headers=headers,
+    )
+
+
+@app.route('/import/<username>', methods=['POST'])
+def import_history(username):
+    user = UserCreds.query.filter_by(name=username).first()
+    if not user:
+        return "User not found", 404
+
+    fmt = request.args.get('format')
+    upload = None
+    # Form bodies are parsed (and consumed) by Werkzeug, so they can only be
+    # imported through a 'file' part; a raw NDJSON/CSV body must not be sent
+    # as a form (curl --data-binary does this unless Content-Type is set).
+    if request.mimetype in ('application/x-www-form-urlencoded', 'multipart/form-data'):
+        upload = request.files.get('file')
+        if upload is None:
+            return jsonify({
+                "success": False,
+                "error": "Upload a 'file' form field, or send the body as application/x-ndjson or text/csv",
+            }), 400
+    if upload is not None:
+        fmt = fmt or ('csv' if upload.filename.lower().endswith('.csv') else 'ndjson')
+        stream = io.TextIOWrapper(upload.stream, encoding='utf-8', newline='')
+    else:
+        fmt = fmt or ('csv' if request.mimetype == 'text/csv' else 'ndjson')
+        stream = io.TextIOWrapper(request.stream, encoding='utf-8', newline='')
+
+    try:
+        count = import_history_rows(user.email, read_history_file(stream, fmt.lower()))
+    except (ValueError, KeyError, csv.Error) as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        # Keep SQL and parameter values in the log, not the response
+        print(f"Error importing history: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({"success": False, "error": "Database error while importing history"}), 500
+
+    return jsonify({"success": True, "imported": count})
+
+
+def open_cli_file(path, mode):
+    """Open a CLI file argument, treating '-' as stdin/stdout."""
+    if path == '-':
+        return contextlib.nullcontext(sys.stdout if 'w' in mode else sys.stdin)
+    return open(path, mode, encoding='utf-8', newline='')
+
+
+@app.cli.command('export-history')
+@click.argument('username')
+@click.option('--format', 'fmt', type=click.Choice(list(EXPORT_MIMETYPES)), default='ndjson')
+@click.option('--output', '-o', default='-', help="Output file path ('-' for stdout)")
+def export_history_command(username, fmt, output):
+    """Stream a user's strategy history to NDJSON, CSV or Parquet."""
+    user = UserCreds.query.filter_by(name=username).first()
+    if not user:
+        raise click.ClickException(f"User not found: {username}")
+
+    table_model = create_db_table(user.email)
+    rows = iter_history_rows(table_model)
+
+    if fmt == 'parquet':
+        if output == '-':
+            raise click.ClickException("Parquet export needs --output FILE")
+        try:
+            export_parquet(rows, output)
+        except ParquetUnavailableError as e:
+            raise click.ClickException(str(e))
+        return
+
+    serializer = export_ndjson if fmt == 'ndjson' else export_csv
+    with open_cli_file(output, 'w') as f:
+        for chunk in serializer(rows):
+            f.write(chunk)
+
+
+@app.cli.command('import-history')
+@click.argument('username')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False, allow_dash=True))
+@click.option('--format', 'fmt', type=click.Choice(['ndjson', 'csv']), default=None,
+              help="Input format (defaults to the file extension)")
+@click.option('--batch-size', default=IMPORT_BATCH_SIZE, show_default=True)
+def import_history_command(username, path, fmt, batch_size):
+    """Bulk-load NDJSON or CSV history into a user's table."""
+    user = UserCreds.query.filter_by(name=username).first()
+    if not user:
+        raise click.ClickException(f"User not found: {username}")
+
+    fmt = fmt or ('csv' if path.lower().endswith('.csv') else 'ndjson')
+    with open_cli_file(path, 'r') as f:
+        try:
+            count = import_history_rows(user.email, read_history_file(f, fmt), batch_size=batch_size)
+        except (ValueError, KeyError, csv.Error) as e:
+            raise click.ClickException(f"Invalid input, nothing imported: {e}")
+    click.echo(f"✓ Imported {count} rows into {username}'s history")
+
+
 @app.route("/navigate_pages", methods=['POST'])
 def navigate_pages():
     selected_users = request.form.get("users")